@@ -1,176 +1,458 @@
+from __future__ import annotations
+
 import argparse
+import asyncio
+import re
 import sys
-import time
-from io import BytesIO
-from logging import INFO, basicConfig, getLogger
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache, partial
+from logging import DEBUG, INFO, basicConfig, getLogger
+from mmap import ACCESS_READ, mmap
 from pathlib import Path
-from tempfile import TemporaryDirectory
-from typing import Any
-
-import requests
-from pypdf import PdfReader
-from selenium.webdriver import Chrome, ChromeOptions
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as ec
-from selenium.webdriver.support.wait import WebDriverWait
-
-# The timeout for the translation to finish
-TRANSLATION_TIMEOUT = 20
-
-logger = getLogger(__name__)
-logger.setLevel(INFO)
-basicConfig()
-
-
-class Options(ChromeOptions):
-    def __init__(self, *, debug: bool = False) -> None:
-        super().__init__()
-
-        self._download_dir = TemporaryDirectory()
-        prefs: dict[str, Any] = {
-            "download.default_directory": self._download_dir.name,
-        }
-
-        if not debug:
-            # headless mode
-            self.add_argument("--headless=new")
-
-            # disable animations
-            self.add_argument("--animation-duration-scale=0")
-
-            # disable the download bubble
-            prefs["download_bubble.partial_view_enabled"] = False
-
-            self.make_normal_user_agent()
-
-        # disable the navigator.webdriver flag
-        self.add_argument("--disable-blink-features=AutomationControlled")
+from typing import TYPE_CHECKING
 
-        # disable the logging
-        self.add_experimental_option("excludeSwitches", ["enable-logging"])
+if TYPE_CHECKING:
+    import httpx
 
-        self.add_experimental_option("prefs", prefs)
+    from .driver import Driver
 
-    def __del__(self) -> None:
-        self._download_dir.cleanup()
+# The maximum number of browsers to translate the files in parallel
+MAX_WORKERS = 4
 
-    @property
-    def download_dir(self) -> Path:
-        return Path(self._download_dir.name)
-
-    def make_normal_user_agent(self) -> None:
-        options = ChromeOptions()
-        options.add_argument("--headless=new")
-        options.add_experimental_option("excludeSwitches", ["enable-logging"])
-
-        with Chrome(options=options) as driver:
-            headless_id = str(driver.execute_script("return navigator.userAgent"))
-            normal_id = headless_id.replace("Headless", "")
-            self.add_argument(f"user-agent={normal_id}")
-
-
-class Driver:
-    url = "https://translate.google.co.jp/?hl=ja&sl=auto&tl=ja&op=docs"
+logger = getLogger(__name__)
 
-    def __init__(self, path: Path, *, debug: bool = False) -> None:
-        self.path = path
-        self.path_ja = path.with_stem(f"{path.stem}_ja")
 
-        logger.info("Setting up...")
-        self.options = Options(debug=debug)
-        logger.info("Launching...")
-        self.driver = Chrome(options=self.options)
+@lru_cache(maxsize=None)
+def _client() -> httpx.Client:
+    import httpx
 
-    def __del__(self) -> None:
-        self.driver.quit()
+    # the client shared by all the downloads to reuse the connections
+    return httpx.Client(
+        http2=True,
+        timeout=httpx.Timeout(3.0, read=30.0),
+        follow_redirects=True,
+    )
 
-    def select_file(self) -> None:
-        file_input = self.driver.find_element(By.NAME, "file")
-        file_input.send_keys(str(self.path.resolve()))
-        logger.info("Selected: '%s'", self.path.name)
 
-    def wait_button(self, xpath: str, timeout: int) -> None:
-        wait = WebDriverWait(self.driver, timeout)
-        button = wait.until(ec.element_to_be_clickable((By.XPATH, xpath)))
-        button.click()
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="A tool to translate your PDF files into Japanese.",
+    )
+    parser.add_argument("--debug", action="store_true", help="debug mode")
+    parser.add_argument(
+        "--serve",
+        action="store_true",
+        help="translate the targets read from stdin line by line",
+    )
+    parser.add_argument("targets", nargs="*", help="URLs or paths to PDF files")
+    args = parser.parse_args()
 
-    def translate(self) -> None:
-        # click the translate button
-        xpath = "//button/span[text()='翻訳']"
-        button = self.driver.find_element(By.XPATH, xpath)
-        button.click()
+    if args.serve and args.targets:
+        parser.error("argument targets: not allowed with argument --serve")
+    if not args.serve and not args.targets:
+        parser.error("the following arguments are required: targets")
+    return args
 
-        logger.info("Translating...")
 
-        # wait for the download button
-        xpath = "//button/span[text()='翻訳をダウンロード']"
-        self.wait_button(xpath, TRANSLATION_TIMEOUT)
+def is_url(target: str) -> bool:
+    return target.startswith("http")
 
-    def wait_to_finish(self) -> None:
-        timeout = 10
-        path = self.options.download_dir / self.path.name
 
-        for _ in range(timeout):
-            time.sleep(1)
-            if path.exists():
-                self.path_ja.unlink(missing_ok=True)
-                path.rename(self.path_ja)
+class DownloadError(Exception):
+    pass
+
+
+# The patterns to read the title from the PDF trailer
+_STARTXREF = re.compile(rb"startxref\s+(\d+)")
+_SUBSECTION = re.compile(rb"\s*(\d+)\s+(\d+)[ \t]*\r?\n")
+_INFO = re.compile(rb"/Info\s+(\d+)\s+(\d+)\s+R")
+_PREV = re.compile(rb"/Prev\s+(\d+)")
+_OBJ = re.compile(rb"\s*(\d+)\s+(\d+)\s+obj")
+
+# The patterns to tokenize the information dictionary
+_SPACE = re.compile(rb"(?:\s|%[^\r\n]*)*")
+_BRACKET = re.compile(rb"<<|>>|[\[\]]")
+_TOKEN = re.compile(rb"\d+\s+\d+\s+R(?![^\s()<>\[\]{}/%])|[{}]|/?[^\s()<>\[\]{}/%]+")
+
+# The bytes where PDFDocEncoding differs from Latin-1
+_NOT_LATIN_1 = re.compile(rb"[\x18-\x1f\x7f-\xa0\xad]")
+
+_ESCAPES = {
+    ord("n"): b"\n",
+    ord("r"): b"\r",
+    ord("t"): b"\t",
+    ord("b"): b"\b",
+    ord("f"): b"\f",
+}
+
+
+def _find_object(data: bytes | mmap, start: int, end: int, num: int) -> int | None:
+    # look up the object in the cross-reference table between start and end
+    pos = start
+    while (match := _SUBSECTION.match(data, pos, end)) is not None:
+        first, count = int(match[1]), int(match[2])
+        pos = match.end() + 20 * count
+        if first <= num < first + count:
+            entry_offset = match.end() + 20 * (num - first)
+            entry = data[entry_offset : entry_offset + 20].split()
+            if len(entry) != 3 or entry[2] != b"n":
+                return None
+            return int(entry[0])
+    return None
+
+
+def _parse_literal(data: bytes, pos: int) -> tuple[bytes, int] | None:
+    result = bytearray()
+    depth = 1
+    while pos < len(data):
+        char = data[pos]
+        pos += 1
+        if char == ord("\\"):
+            if pos >= len(data):
                 break
+            char = data[pos]
+            pos += 1
+            if char in _ESCAPES:
+                result += _ESCAPES[char]
+            elif ord("0") <= char <= ord("7"):
+                # up to three octal digits
+                value = char - ord("0")
+                for _ in range(2):
+                    if pos >= len(data) or not ord("0") <= data[pos] <= ord("7"):
+                        break
+                    value = value * 8 + data[pos] - ord("0")
+                    pos += 1
+                result.append(value & 0xFF)
+            elif char == ord("\r"):
+                pos += data[pos : pos + 1] == b"\n"
+            elif char != ord("\n"):
+                result.append(char)
+        elif char == ord("("):
+            depth += 1
+            result.append(char)
+        elif char == ord(")"):
+            depth -= 1
+            if depth == 0:
+                return bytes(result), pos
+            result.append(char)
         else:
-            msg = f"Timeout: {timeout} sec"
-            raise TimeoutError(msg)
+            result.append(char)
+    return None
 
-    def save(self) -> None:
-        logger.info("Saving as: '%s'", self.path_ja.name)
-        self.wait_to_finish()
 
-    def run(self) -> None:
-        self.driver.get(Driver.url)
-        self.select_file()
-        self.translate()
-        self.save()
-        logger.info("Done.")
+def _skip_space(data: bytes, pos: int) -> int:
+    match = _SPACE.match(data, pos)
+    return match.end() if match is not None else pos
 
 
-def parse_args() -> argparse.Namespace:
-    parser = argparse.ArgumentParser(
-        description="A tool to translate your PDF files into Japanese.",
-    )
-    parser.add_argument("--debug", action="store_true", help="debug mode")
-    parser.add_argument("target", help="URL or path to PDF file")
-    return parser.parse_args()
-
-
-def is_url(target: str) -> bool:
-    return target.startswith("http")
+def _decode_string(data: bytes, pos: int) -> str | None:
+    try:
+        if data[pos : pos + 1] == b"(":
+            literal = _parse_literal(data, pos + 1)
+            if literal is None:
+                return None
+            raw = literal[0]
+        elif data[pos : pos + 1] == b"<":
+            end = data.find(b">", pos)
+            if end < 0:
+                return None
+            digits = re.sub(rb"\s", b"", data[pos + 1 : end])
+            raw = bytes.fromhex((digits + b"0" * (len(digits) % 2)).decode())
+        else:
+            # e.g. an indirect reference
+            return None
+
+        if raw.startswith(b"\xfe\xff"):
+            return raw[2:].decode("utf-16-be")
+        if raw.startswith(b"\xff\xfe"):
+            return raw[2:].decode("utf-16-le")
+        if raw.startswith(b"\xef\xbb\xbf"):
+            return raw[3:].decode("utf-8")
+        if _NOT_LATIN_1.search(raw):
+            return None
+        return raw.decode("latin-1")
+    except ValueError:
+        # broken hex digits or text (UnicodeDecodeError), left to PdfReader
+        return None
+
+
+def _parse_title(obj: bytes) -> str | None:
+    pos = _skip_space(obj, 0)
+    if not obj.startswith(b"<<", pos):
+        return None
+    pos += 2
+
+    # walk the dictionary so that only a key of its own is taken as /Title,
+    # not one inside a string or a nested object
+    depth = 1
+    key = None
+    while True:
+        pos = _skip_space(obj, pos)
+        if depth == 1 and key == b"/Title":
+            return _decode_string(obj, pos)
+
+        token = None
+        if (match := _BRACKET.match(obj, pos)) is not None:
+            pos = match.end()
+            if match[0] in (b"<<", b"["):
+                depth += 1
+                continue
+            depth -= 1
+        elif obj.startswith(b"(", pos):
+            literal = _parse_literal(obj, pos + 1)
+            if literal is None:
+                return None
+            pos = literal[1]
+        elif obj.startswith(b"<", pos):
+            pos = obj.find(b">", pos) + 1
+            if pos == 0:
+                return None
+        elif (match := _TOKEN.match(obj, pos)) is not None:
+            token = match[0]
+            pos = match.end()
+        else:
+            return None
+
+        # the end of the dictionary without /Title
+        if depth <= 0:
+            return None
+        # the keys and the values alternate in the dictionary itself
+        if depth == 1:
+            if key is not None:
+                key = None
+            elif token is not None and token.startswith(b"/"):
+                key = token
+            else:
+                return None
+
+
+def _read_pdf_title(data: bytes | mmap) -> str | None:
+    """Read the title from the document information dictionary.
+
+    Only the trailer, the cross-reference table and the information dictionary
+    are read, instead of parsing the whole PDF. `None` is returned when the
+    file is not plain enough, e.g. it uses cross-reference streams or is
+    encrypted.
+    """
+    pos = data.rfind(b"startxref")
+    match = _STARTXREF.match(data, pos) if pos >= 0 else None
+    offset = int(match[1]) if match is not None else None
+    info = None
+    seen = set()
+
+    # follow the previous cross-reference sections of incremental updates
+    while offset is not None:
+        # a /Prev pointing back to a section already read would loop forever
+        if offset in seen:
+            return None
+        seen.add(offset)
+        if data[offset : offset + 4] != b"xref":
+            return None
+
+        trailer = data.find(b"trailer", offset)
+        end = data.find(b"startxref", trailer)
+        if trailer < 0 or end < 0:
+            return None
+
+        dictionary = data[trailer:end]
+        if b"/Encrypt" in dictionary:
+            return None
+        if info is None:
+            match = _INFO.search(dictionary)
+            if match is None:
+                return None
+            info = int(match[1])
+
+        obj_offset = _find_object(data, offset + 4, trailer, info)
+        if obj_offset is not None:
+            match = _OBJ.match(data, obj_offset)
+            if match is None or int(match[1]) != info:
+                return None
+            # slice only the object itself out of the mapped file
+            obj_end = data.find(b"endobj", match.end())
+            if obj_end < 0:
+                return None
+            return _parse_title(data[match.end() : obj_end])
+
+        match = _PREV.search(dictionary)
+        offset = int(match[1]) if match is not None else None
+
+    return None
+
+
+def _fetch(url: str, dst_path: Path) -> None:
+    import httpx
+
+    # stream the response to the file instead of holding it in memory
+    try:
+        with _client().stream("GET", url) as res:
+            res.raise_for_status()
+            with dst_path.open("wb") as dst:
+                for chunk in res.iter_bytes(1 << 20):
+                    dst.write(chunk)
+    except httpx.TimeoutException as e:
+        msg = f"Timeout occurred: {url}"
+        raise DownloadError(msg) from e
+    except httpx.HTTPError as e:
+        msg = f"Failed to download: {url} ({e})"
+        raise DownloadError(msg) from e
+
+
+def _read_title(path: Path) -> str | None:
+    # an empty file cannot be mapped
+    if path.stat().st_size == 0:
+        msg = "The downloaded file is empty."
+        raise DownloadError(msg)
+
+    # parse the file through the page cache rather than a private copy
+    with path.open("rb") as src, mmap(src.fileno(), 0, access=ACCESS_READ) as mm:
+        title = _read_pdf_title(mm)
+        found = title is not None
+        if not found:
+            from pypdf import PdfReader
+            from pypdf.errors import PyPdfError
+
+            # fall back to parsing the whole PDF
+            try:
+                metadata = PdfReader(mm).metadata  # type: ignore[arg-type]
+            except PyPdfError as e:
+                msg = f"Failed to read the PDF: {e}"
+                raise DownloadError(msg) from e
+            found = metadata is not None
+            title = metadata.title if metadata is not None else None
+
+    if not found:
+        msg = "Failed to get the title from the PDF metadata."
+        raise DownloadError(msg)
+    return title
 
 
 def download(url: str) -> Path:
+    basename = Path(url).name
+    filename = Path(basename if basename.endswith(".pdf") else f"{basename}.pdf")
+
+    # download next to the destination and keep it only when it succeeds
+    part = filename.with_name(f"{filename.name}.part")
     try:
-        res = requests.get(url, timeout=3)
-    except requests.exceptions.Timeout:
-        logger.exception("Timeout occurred")
-        sys.exit(1)
+        _fetch(url, part)
+        title = _read_title(part)
+        part.replace(filename)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+
+    logger.info("Title: %s", title)
+    return filename
 
-    pdf = PdfReader(BytesIO(res.content))
 
-    if pdf.metadata is None:
-        logger.error("Failed to get the title from the PDF metadata.")
-        sys.exit(1)
+def get_path(target: str) -> Path:
+    return download(target) if is_url(target) else Path(target)
 
-    logger.info("Title: %s", pdf.metadata.title)
-    basename = Path(url).name
-    filename = Path(basename if basename.endswith(".pdf") else f"{basename}.pdf")
-    filename.write_bytes(res.content)
-    return filename
+
+def translate(driver: Driver, target: str) -> bool:
+    # log any failure and go on to the next target, so that one bad file never
+    # stops the others
+    try:
+        driver.translate_file(get_path(target))
+    except DownloadError as e:
+        logger.error("%s", e)
+    except Exception:
+        logger.exception("Failed to translate: '%s'", target)
+    else:
+        return True
+    return False
+
+
+def serve(driver: Driver) -> int:
+    # keep the browser running for all the targets
+    failures = 0
+    for line in sys.stdin:
+        target = line.strip()
+        if target and not translate(driver, target):
+            failures += 1
+    return failures
+
+
+async def translate_all(
+    targets: list[str],
+    *,
+    debug: bool = False,
+    user_agent: Future[str] | None = None,
+) -> int:
+    from .driver import Driver
+
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[str | None] = asyncio.Queue()
+    workers = min(MAX_WORKERS, len(targets))
+    for target in [*targets, *[None] * workers]:
+        queue.put_nowait(target)
+
+    async def worker() -> int:
+        # each browser is launched once and downloads and translates in turn
+        try:
+            driver = await loop.run_in_executor(
+                None, partial(Driver, debug=debug, user_agent=user_agent)
+            )
+        except Exception:
+            # leave the targets to the other browsers
+            logger.exception("Failed to launch the browser")
+            return 0
+
+        failures = 0
+        while (target := await queue.get()) is not None:
+            if not await loop.run_in_executor(None, translate, driver, target):
+                failures += 1
+        return failures
+
+    failures = sum(await asyncio.gather(*(worker() for _ in range(workers))))
+
+    # report the targets left when no browser could be launched
+    while not queue.empty():
+        target = queue.get_nowait()
+        if target is not None:
+            logger.error("Not translated: '%s'", target)
+            failures += 1
+    return failures
 
 
 def main() -> None:
     args = parse_args()
-    target: str = args.target
-    path = download(target) if is_url(target) else Path(target)
-    driver = Driver(path, debug=args.debug)
-    driver.run()
+
+    # leave the other libraries at the default level to keep their logs quiet
+    basicConfig()
+    getLogger("pdfjp").setLevel(DEBUG if args.debug else INFO)
+
+    # import selenium only after parsing the arguments, as it is slow to import
+    from .driver import Driver, load_user_agent
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        # get the user agent while downloading and setting up
+        user_agent = None if args.debug else executor.submit(load_user_agent)
+
+        if len(args.targets) > 1:
+            failures = asyncio.run(
+                translate_all(args.targets, debug=args.debug, user_agent=user_agent)
+            )
+            if failures:
+                logger.error("Failed: %d of %d targets", failures, len(args.targets))
+                sys.exit(1)
+            return
+
+        try:
+            path = None if args.serve else get_path(args.targets[0])
+        except DownloadError as e:
+            logger.error("%s", e)
+            sys.exit(1)
+
+        driver = Driver(debug=args.debug, user_agent=user_agent)
+
+    if path is None:
+        failures = serve(driver)
+        if failures:
+            logger.error("Failed: %d targets", failures)
+            sys.exit(1)
+    else:
+        driver.translate_file(path)
 
 
 if __name__ == "__main__":
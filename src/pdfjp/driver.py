@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import Future
+from logging import getLogger
+from pathlib import Path
+from tempfile import NamedTemporaryFile, mkdtemp
+from typing import Any
+
+from platformdirs import user_cache_dir
+from selenium.common.exceptions import (
+    NoSuchElementException,
+    StaleElementReferenceException,
+)
+from selenium.webdriver import Chrome, ChromeOptions
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as ec
+from selenium.webdriver.support.wait import WebDriverWait
+
+# The timeout for the translation to finish
+TRANSLATION_TIMEOUT = 20
+
+# The timeout for the buttons to be clickable
+BUTTON_TIMEOUT = 10
+
+# The interval between the checks of the page
+POLL_FREQUENCY = 0.1
+
+# The exceptions expected while the page is being rendered
+IGNORED_EXCEPTIONS = (NoSuchElementException, StaleElementReferenceException)
+
+# The locators of the elements on the page
+FILE_INPUT = (By.NAME, "file")
+TRANSLATE_BUTTON = (By.XPATH, "//button/span[text()='翻訳']")
+DOWNLOAD_BUTTON = (By.XPATH, "//button/span[text()='翻訳をダウンロード']")
+
+# The free space needed to put the browser files on tmpfs
+TMPFS_MIN_FREE = 1024 * 1024 * 1024
+
+# The cache of the user agent without "Headless"
+USER_AGENT_CACHE = Path(user_cache_dir("pdfjp")) / "user_agent.txt"
+
+logger = getLogger(__name__)
+
+
+def probe_user_agent() -> str:
+    options = ChromeOptions()
+    options.add_argument("--headless=new")
+    options.add_experimental_option("excludeSwitches", ["enable-logging"])
+
+    with Chrome(options=options) as driver:
+        headless_id = str(driver.execute_script("return navigator.userAgent"))
+        return headless_id.replace("Headless", "")
+
+
+def load_user_agent(*, refresh: bool = False) -> str:
+    # launching another browser is slow, so probe only once per Chrome version
+    if not refresh and USER_AGENT_CACHE.exists():
+        return USER_AGENT_CACHE.read_text().strip()
+
+    user_agent = probe_user_agent()
+    USER_AGENT_CACHE.parent.mkdir(parents=True, exist_ok=True)
+
+    # replace the cache at once so that concurrent runs never read a partial file
+    with NamedTemporaryFile(
+        "w", dir=USER_AGENT_CACHE.parent, delete=False, suffix=".tmp"
+    ) as f:
+        f.write(user_agent)
+    os.replace(f.name, USER_AGENT_CACHE)
+    return user_agent
+
+
+def _tmpfs_dir() -> str | None:
+    tmpfs = Path("/dev/shm")
+    if sys.platform != "linux" or not tmpfs.is_dir():
+        # use the default temporary directory on the other platforms
+        return None
+
+    # Chrome needs /dev/shm for its own shared memory too, and it is often
+    # small in containers (64 MB by default in Docker)
+    if shutil.disk_usage(tmpfs).free < TMPFS_MIN_FREE:
+        return None
+    return str(tmpfs)
+
+
+class Options(ChromeOptions):
+    def __init__(
+        self,
+        *,
+        debug: bool = False,
+        user_agent: Future[str] | str | None = None,
+    ) -> None:
+        super().__init__()
+
+        # keep the profile, the cache and the downloads off the disk if possible
+        temp_dir = Path(mkdtemp(prefix="pdfjp-", dir=_tmpfs_dir()))
+        atexit.register(shutil.rmtree, temp_dir, ignore_errors=True)
+        self.add_argument(f"--user-data-dir={temp_dir / 'profile'}")
+        self.add_argument(f"--disk-cache-dir={temp_dir / 'cache'}")
+
+        # the download directory is set through CDP after launching
+        self._download_dir = temp_dir / "downloads"
+        self._download_dir.mkdir()
+        self.user_agent: str | None = None
+        prefs: dict[str, Any] = {}
+
+        if not debug:
+            # headless mode
+            self.add_argument("--headless=new")
+
+            # disable animations
+            self.add_argument("--animation-duration-scale=0")
+
+            # disable the download bubble
+            prefs["download_bubble.partial_view_enabled"] = False
+
+            # block the resources which are not needed to operate the page
+            prefs["profile.managed_default_content_settings.images"] = 2
+            prefs["profile.default_content_setting_values.notifications"] = 2
+            self.add_argument("--blink-settings=imagesEnabled=false")
+
+        # return from loading pages at DOMContentLoaded
+        self.page_load_strategy = "eager"
+
+        # disable the navigator.webdriver flag
+        self.add_argument("--disable-blink-features=AutomationControlled")
+
+        # disable the logging
+        self.add_experimental_option("excludeSwitches", ["enable-logging"])
+
+        self.add_experimental_option("prefs", prefs)
+
+        # record the CDP events to detect the download progress; the performance
+        # log only carries the Network and Page domains, so this relies on the
+        # (deprecated) Page.downloadWillBegin and Page.downloadProgress events,
+        # and Network is left out
+        self.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+        self.add_experimental_option(
+            "perfLoggingPrefs", {"enableNetwork": False, "enablePage": True}
+        )
+
+        if not debug:
+            # wait for the user agent as late as possible when it is being probed
+            if isinstance(user_agent, Future):
+                self.user_agent = user_agent.result()
+            elif user_agent is None:
+                self.user_agent = load_user_agent()
+            else:
+                self.user_agent = user_agent
+            self.add_argument(f"user-agent={self.user_agent}")
+
+    @property
+    def download_dir(self) -> Path:
+        return self._download_dir
+
+
+class Driver:
+    url = "https://translate.google.co.jp/?hl=ja&sl=auto&tl=ja&op=docs"
+
+    def __init__(
+        self,
+        *,
+        debug: bool = False,
+        user_agent: Future[str] | None = None,
+    ) -> None:
+        logger.info("Setting up...")
+        self.options = Options(debug=debug, user_agent=user_agent)
+        logger.info("Launching...")
+        self.driver = Chrome(options=self.options)
+
+        # the cached user agent is stale once Chrome has been updated
+        if not self.is_user_agent_current():
+            logger.info("Chrome has been updated. Relaunching...")
+            self.driver.quit()
+            self.options = Options(
+                debug=debug, user_agent=load_user_agent(refresh=True)
+            )
+            self.driver = Chrome(options=self.options)
+
+        # rely only on the explicit waits so that each poll returns at once
+        self.driver.implicitly_wait(0)
+        self._wait = WebDriverWait(
+            self.driver,
+            BUTTON_TIMEOUT,
+            poll_frequency=POLL_FREQUENCY,
+            ignored_exceptions=IGNORED_EXCEPTIONS,
+        )
+        self._wait_long = WebDriverWait(
+            self.driver,
+            TRANSLATION_TIMEOUT,
+            poll_frequency=POLL_FREQUENCY,
+            ignored_exceptions=IGNORED_EXCEPTIONS,
+        )
+
+        # the download started by the last click of the download button
+        self._download_guid: str | None = None
+
+        # save downloads by their GUIDs and emit the progress events
+        self.driver.execute_cdp_cmd(
+            "Browser.setDownloadBehavior",
+            {
+                "behavior": "allowAndName",
+                "downloadPath": str(self.options.download_dir),
+                "eventsEnabled": True,
+            },
+        )
+
+    def __del__(self) -> None:
+        self.driver.quit()
+
+    def is_user_agent_current(self) -> bool:
+        normal_id = self.options.user_agent
+        major = str(self.driver.capabilities["browserVersion"]).split(".")[0]
+        return normal_id is None or f"Chrome/{major}." in normal_id
+
+    def select_file(self) -> None:
+        # the page may still be loading with the eager strategy
+        file_input = self._wait.until(ec.presence_of_element_located(FILE_INPUT))
+        file_input.send_keys(str(self.path.resolve()))
+        logger.info("Selected: '%s'", self.path.name)
+
+    def wait_button(
+        self, locator: tuple[str, str], wait: WebDriverWait[Chrome]
+    ) -> None:
+        button = wait.until(ec.element_to_be_clickable(locator))
+        button.click()
+
+    def translate(self) -> None:
+        # click the translate button
+        self.wait_button(TRANSLATE_BUTTON, self._wait)
+
+        logger.info("Translating...")
+
+        # wait for the download button
+        button = self._wait_long.until(ec.element_to_be_clickable(DOWNLOAD_BUTTON))
+
+        # drop the events left by the files before, e.g. one which timed out
+        self.driver.get_log("performance")  # type: ignore[no-untyped-call]
+        self._download_guid = None
+        button.click()
+
+    def completed_download(self) -> str | None:
+        """Return the GUID of the download started by the click once completed."""
+        for entry in self.driver.get_log("performance"):  # type: ignore[no-untyped-call]
+            message = json.loads(entry["message"])["message"]
+            params = message["params"]
+            if message["method"] == "Page.downloadWillBegin":
+                # the first download after the click is the translated file
+                if self._download_guid is None:
+                    self._download_guid = str(params["guid"])
+                continue
+            if (
+                message["method"] != "Page.downloadProgress"
+                or params["guid"] != self._download_guid
+            ):
+                continue
+
+            if params["state"] == "completed":
+                return str(params["guid"])
+            if params["state"] == "canceled":
+                # fail now rather than waiting for the timeout
+                msg = "Download canceled"
+                raise RuntimeError(msg)
+        return None
+
+    def wait_to_finish(self) -> None:
+        timeout = 10
+        deadline = time.monotonic() + timeout
+
+        while time.monotonic() < deadline:
+            guid = self.completed_download()
+            if guid is not None:
+                # tmpfs may be another file system, so os.replace() does not work
+                shutil.move(self.options.download_dir / guid, self._path_ja_str)
+                break
+            time.sleep(POLL_FREQUENCY)
+        else:
+            msg = f"Timeout: {timeout} sec"
+            raise TimeoutError(msg)
+
+    def save(self) -> None:
+        logger.info("Saving as: '%s'", self.path_ja.name)
+        self.wait_to_finish()
+
+    def run(self) -> None:
+        self.driver.get(Driver.url)
+        self.select_file()
+        self.translate()
+        self.save()
+        logger.info("Done.")
+
+    def translate_file(self, path: Path) -> None:
+        self.path = path
+        self.path_ja = path.with_name(f"{path.stem}_ja{path.suffix}")
+        self._path_ja_str = os.fspath(self.path_ja)
+        self.run()
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import asyncio
+import re
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+from pypdf import PdfReader
+
+from pdfjp import driver
+from pdfjp.cli import _read_pdf_title, _read_title, translate_all
+
+CATALOG = {
+    1: b"<< /Type /Catalog /Pages 2 0 R >>",
+    2: b"<< /Type /Pages /Kids [] /Count 0 >>",
+}
+
+
+def append_section(
+    pdf: bytearray, objects: dict[int, bytes], prev: int | None = None
+) -> int:
+    offsets = {}
+    for num, body in objects.items():
+        offsets[num] = len(pdf)
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+
+    xref = len(pdf)
+    pdf += b"xref\n"
+    if prev is None:
+        pdf += b"0 1\n0000000000 65535 f \n"
+    for num, offset in offsets.items():
+        pdf += b"%d 1\n%010d 00000 n \n" % (num, offset)
+
+    pdf += b"trailer\n<< /Size 4 /Root 1 0 R /Info 3 0 R"
+    if prev is not None:
+        pdf += b" /Prev %d" % prev
+    pdf += b" >>\nstartxref\n%d\n%%%%EOF\n" % xref
+    return xref
+
+
+def make_pdf(info: bytes, *updates: dict[int, bytes]) -> bytes:
+    pdf = bytearray(b"%PDF-1.4\n")
+    xref = append_section(pdf, {**CATALOG, 3: info})
+    for objects in updates:
+        xref = append_section(pdf, objects, xref)
+    return bytes(pdf)
+
+
+def read_title_with_pypdf(pdf: bytes) -> str | None:
+    metadata = PdfReader(BytesIO(pdf)).metadata
+    return metadata.title if metadata is not None else None
+
+
+@pytest.mark.parametrize(
+    ("info", "title"),
+    [
+        (b"<< /Title (Plain) >>", "Plain"),
+        (b"<< /Title (a\\(b\\) (c) \\\\d\\n) >>", "a(b) (c) \\d\n"),
+        (b"<< /Title (\\101\\102\\0103) >>", "AB\x083"),
+        (b"<< /Title (line \\\ncontinued) >>", "line continued"),
+        (b"<< /Title (Caf\\351) >>", "Café"),
+        (b"<< /Title <48 65 6C 6C 6F> >>", "Hello"),
+        (b"<< /Title <FEFF30C630B930C8> >>", "テスト"),
+        (b"<< /Title <FFFE410042004300> >>", "ABC"),
+        (b"<< /Title (\\376\\377\\060\\306\\060\\271) >>", "テス"),
+        (b"<< /Author (x) /Title (Second) >>", "Second"),
+        (b"<< /Author (see /Title (Fake)) /Title (Real) >>", "Real"),
+        (b"<< /A << /Title (Nested) >> /B [/Title (x)] /Title (Real) >>", "Real"),
+        (b"<< /A 5 0 R /Title % comment\n(Real) >>", "Real"),
+    ],
+)
+def test_read_pdf_title(info: bytes, title: str) -> None:
+    pdf = make_pdf(info)
+    assert _read_pdf_title(pdf) == title
+    assert read_title_with_pypdf(pdf) == title
+
+
+def test_read_pdf_title_follows_prev() -> None:
+    # the update does not contain the information dictionary
+    pdf = make_pdf(b"<< /Title (Original) >>", {2: CATALOG[2]})
+    assert _read_pdf_title(pdf) == "Original"
+
+
+def test_read_pdf_title_uses_latest_update() -> None:
+    pdf = make_pdf(b"<< /Title (Original) >>", {3: b"<< /Title (Updated) >>"})
+    assert _read_pdf_title(pdf) == "Updated"
+
+
+def test_read_pdf_title_stops_at_prev_loop() -> None:
+    pdf = make_pdf(b"<< /Title (Original) >>", {2: CATALOG[2]})
+    first, last = (int(m) for m in re.findall(rb"startxref\n(\d+)", pdf))
+    # the update points back to itself instead of the original section
+    pdf = pdf.replace(b"/Prev %d" % first, b"/Prev %d" % last)
+    assert _read_pdf_title(pdf) is None
+
+
+@pytest.mark.parametrize(
+    "info",
+    [
+        # broken strings which PdfReader still reads
+        b"<< /Title <zz> >>",
+        b"<< /Title <FEFF00> >>",
+        b"<< /Title <FEFFD800> >>",
+        b"<< /Title (\\376\\377\\000) >>",
+        # strings not handled here
+        b"<< /Title 4 0 R >>",
+        b"<< /Title (\\200) >>",
+        b"<< /Title (unterminated >>",
+        # no title of its own
+        b"<< /Subject (x /Title (Fake) y) >>",
+    ],
+)
+def test_read_pdf_title_falls_back(info: bytes, tmp_path: Path) -> None:
+    pdf = make_pdf(info)
+    assert _read_pdf_title(pdf) is None
+
+    # the whole PDF is parsed instead
+    path = tmp_path / "test.pdf"
+    path.write_bytes(pdf)
+    assert _read_title(path) == read_title_with_pypdf(pdf)
+
+
+@pytest.mark.parametrize(
+    "pdf",
+    [
+        b"",
+        b"%PDF-1.4\nno cross-reference table",
+        b"%PDF-1.4\nstartxref\n9\n%%EOF\n",
+        make_pdf(b"<< /Title (x) >>").replace(b"/Info 3 0 R", b"/Encrypt 3 0 R"),
+    ],
+)
+def test_read_pdf_title_unsupported(pdf: bytes) -> None:
+    assert _read_pdf_title(pdf) is None
+
+
+class FakeDriver:
+    def __init__(self, **kwargs: object) -> None:
+        pass
+
+    def translate_file(self, path: Path) -> None:
+        if path.name == "bad.pdf":
+            msg = "broken"
+            raise RuntimeError(msg)
+
+
+class BrokenDriver:
+    def __init__(self, **kwargs: object) -> None:
+        msg = "no browser"
+        raise RuntimeError(msg)
+
+
+def test_translate_all_counts_failures(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(driver, "Driver", FakeDriver)
+    targets = ["a.pdf", "bad.pdf", "b.pdf"]
+    assert asyncio.run(translate_all(targets)) == 1
+
+
+def test_translate_all_reports_targets_left(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(driver, "Driver", BrokenDriver)
+    targets = ["a.pdf", "b.pdf", "c.pdf", "d.pdf", "e.pdf"]
+    assert asyncio.run(translate_all(targets)) == len(targets)